@@ -1,7 +1,8 @@
-import io
 import os
 import random
 import argparse
+from itertools import count, cycle, islice
+from operator import attrgetter
 
 
 def get_args():
@@ -17,8 +18,9 @@ def get_args():
     return parser.parse_args()
 
 
-output = io.StringIO()  # file-like object that stores data inputted or printed to the console for
-# logging purposes upon request
+BUFFER_SIZE = 1 << 20  # 1 MiB buffer for card and log files; fewer read/write syscalls than the 8 KiB default
+
+output_lines = []  # stores every line inputted or printed to the console for logging purposes upon request
 
 
 class Flashcard:
@@ -30,29 +32,104 @@ class Flashcard:
         Error count: total number of wrong guesses that have been made on a single card
 
     - Static dictionaries: flashcards -> dict
-                        definitions -> dict
+                        definitions_ci -> dict
         * flashcards - stores all instances of created or imported flashcards as values; under terms as keys
-        * definitions - stores all definitions as keys to prevent creation of cards with the same definition
-             We used a dictionary that has definitions as keys and terms as values instead of just a set of definitions
-             just to be able to inform the user if they have guessed the correct answer but to the wrong card.
+        * definitions_ci - stores case-folded definitions as keys to prevent creation of cards with the same definition
+             (ignoring case). We used a dictionary that has definitions as keys and terms as values instead of just a set
+             of definitions just to be able to inform the user if they have guessed the correct answer but to the wrong
+             card. Several cards may share a definition that differs only by case (e.g. in imported files); only then
+             is the value a list of their terms, so that the common case allocates no extra object per card.
+    - Running error index: max_error -> int
+                           hardest_terms -> set
+        * max_error - highest error count among all flashcards
+        * hardest_terms - terms of the cards whose error count equals max_error
+    - Deck position: every card gets an increasing position when it enters the deck, so that the hardest cards can be
+        reported in deck order (the order of Flashcard.flashcards) without scanning the whole deck
     """
 
+    __slots__ = ('term', 'definition', 'definition_cf', 'error_count', 'position')  # no per-instance __dict__
+
     flashcards = {}  # term(key): Flashcard() (value)
-    definitions = {}  # definition(key): term(value)
+    definitions_ci = {}  # definition.casefold()(key): term or [term, ...](value)
+    max_error = 0
+    hardest_terms = set()
+    positions = count()  # source of deck positions for new cards
 
     def __init__(self, term, definition, error_count=0):
+        # import_file() inlines these assignments for speed; keep both in sync with __slots__
         self.term = term
         self.definition = definition
+        self.definition_cf = definition.casefold()  # cached for case-insensitive comparison in ask()
         self.error_count = error_count  # total number of mistakes made when asked about flashcard
+        self.position = next(Flashcard.positions)
 
-        Flashcard.definitions[definition] = term
+        Flashcard.register_definition(self)
 
     def set_term(self, term):
         self.term = term
 
     def set_definition(self, definition):
+        Flashcard.unregister_definition(self)
         self.definition = definition
-        Flashcard.definitions[definition] = self.term
+        self.definition_cf = definition.casefold()
+        Flashcard.register_definition(self)
+
+    @staticmethod
+    def register_definition(flashcard):
+        """Add given flashcard's term to the case-insensitive definition index."""
+
+        term = flashcard.term
+        terms = Flashcard.definitions_ci.setdefault(flashcard.definition_cf, term)
+        if terms is term:
+            return
+        if isinstance(terms, list):
+            terms.append(term)
+        else:
+            Flashcard.definitions_ci[flashcard.definition_cf] = [terms, term]
+
+    @staticmethod
+    def unregister_definition(flashcard):
+        """Remove given flashcard's term from the case-insensitive definition index, if it is there."""
+
+        term = flashcard.term
+        terms = Flashcard.definitions_ci.get(flashcard.definition_cf)
+        if terms == term:
+            del Flashcard.definitions_ci[flashcard.definition_cf]
+        elif isinstance(terms, list) and term in terms:
+            terms.remove(term)
+            if len(terms) == 1:
+                Flashcard.definitions_ci[flashcard.definition_cf] = terms[0]
+
+    @staticmethod
+    def term_for_definition(definition_cf):
+        """Return a term whose definition matches given case-folded definition, or None if there is no such term."""
+
+        terms = Flashcard.definitions_ci.get(definition_cf)
+        return terms[0] if isinstance(terms, list) else terms
+
+    @staticmethod
+    def track_errors(flashcard):
+        """Update the running error index after error count of given flashcard has grown."""
+
+        error_count = flashcard.error_count
+        if error_count > Flashcard.max_error:
+            Flashcard.max_error = error_count
+            Flashcard.hardest_terms = {flashcard.term}
+        elif error_count == Flashcard.max_error:
+            Flashcard.hardest_terms.add(flashcard.term)
+
+    @staticmethod
+    def rebuild_error_index():
+        """Recompute the running error index from scratch by scanning all flashcards."""
+
+        flashcards = Flashcard.flashcards.values()
+        max_error = max(map(attrgetter('error_count'), flashcards), default=0)  # attrgetter runs in C
+        Flashcard.max_error = max_error
+        if max_error == 0:
+            Flashcard.hardest_terms = set()
+        else:
+            Flashcard.hardest_terms = {flashcard.term for flashcard in flashcards
+                                       if flashcard.error_count == max_error}
 
     def __repr__(self):
         return f"{self.term}=|={self.definition}=|={self.error_count}"
@@ -61,13 +138,13 @@ class Flashcard:
 def out(msg):
     """To be used instead of print()"""
     print(msg)
-    output.write(msg + '\n')
+    output_lines.append(msg)
 
 
 def _input():
     """To be used instead of input()"""
     string = input()
-    print(string, file=output)
+    output_lines.append(string)
     return string
 
 
@@ -76,6 +153,7 @@ def add():
 
     Restrictions:
         1. Cannot create card with the same term/definition that already exists
+        2. Definitions are compared case-insensitively, the same way answers are checked in ask()
     """
 
     out(f"The card:")
@@ -89,7 +167,7 @@ def add():
     out(f"The definition of the card:")
     while True:
         definition = _input()
-        if definition in Flashcard.definitions:
+        if definition.casefold() in Flashcard.definitions_ci:
             out(f'The definition "{definition}" already exists. Try again:')
         else:
             break
@@ -103,13 +181,15 @@ def remove():
 
     out('Which card?')
     card = _input()
-    try:
-        definition = Flashcard.flashcards[card].definition
-    except KeyError:
+    flashcard = Flashcard.flashcards.pop(card, None)
+    if flashcard is None:
         out(f'Can\'t remove "{card}": there is no such card.')
     else:
-        del Flashcard.flashcards[card]
-        del Flashcard.definitions[definition]
+        Flashcard.unregister_definition(flashcard)
+        if card in Flashcard.hardest_terms:
+            Flashcard.hardest_terms.remove(card)
+            if not Flashcard.hardest_terms:
+                Flashcard.rebuild_error_index()
         out("The card has been removed.")
 
 
@@ -124,14 +204,46 @@ def import_file(filename=None):
         out("File not found.")
         return
 
-    with open(filename, 'r') as file:
-        n = 0
-        for line in file:
-            term, definition, error_count = line.strip().split('=|=')  # '=|=' is a separator in files that contain flashcards
-            Flashcard.flashcards[term] = Flashcard(term, definition, int(error_count))
-            n += 1
-
-    out(f"{n} cards have been loaded.")
+    with open(filename, 'r', buffering=BUFFER_SIZE) as file:
+        # read the whole file at once instead of iterating line by line; split on '\n' only (text mode already
+        # normalises line endings), as splitlines() would also break definitions containing e.g. '\x0c' or '\u2028'
+        lines = file.read().split('\n')
+    if lines[-1] == '':
+        lines.pop()  # the file ends with a newline
+
+    # local aliases avoid repeated class attribute lookups inside the loop
+    new_card = Flashcard.__new__
+    flashcards = Flashcard.flashcards
+    positions = Flashcard.positions
+    unregister_definition = Flashcard.unregister_definition
+    ci_setdefault = Flashcard.definitions_ci.setdefault
+    register_definition = Flashcard.register_definition
+
+    for line in lines:
+        # '=|=' is a separator in files that contain flashcards; partition stops scanning at the first match
+        term, _, rest = line.strip().partition('=|=')
+        definition, _, error_count = rest.partition('=|=')
+        # a replaced card keeps its place in Flashcard.flashcards, so the new card takes over its position
+        replaced = flashcards.get(term)
+        if replaced is None:
+            position = next(positions)
+        else:
+            position = replaced.position
+            unregister_definition(replaced)
+        # same as Flashcard(term, definition, int(error_count)), with __init__ inlined
+        flashcard = new_card(Flashcard)
+        flashcard.term = term
+        flashcard.definition = definition
+        flashcard.definition_cf = definition_cf = definition.casefold()
+        flashcard.error_count = int(error_count)
+        flashcard.position = position
+        flashcards[term] = flashcard
+        # Flashcard.register_definition(), inlined for the common case of a definition no other card has
+        if ci_setdefault(definition_cf, term) is not term:
+            register_definition(flashcard)
+
+    Flashcard.rebuild_error_index()  # imported cards may replace existing ones and bring their own error counts
+    out(f"{len(lines)} cards have been loaded.")
 
 
 def export(filename=None):
@@ -142,9 +254,11 @@ def export(filename=None):
         out("File name:")
         filename = _input()
 
-    with open(filename, 'w') as file:
-        for flashcard in Flashcard.flashcards.values():
-            print(f"{flashcard.term}=|={flashcard.definition}=|={flashcard.error_count}", file=file)
+    line_format = '%s=|=%s=|=%d\n'
+    content = ''.join([line_format % (flashcard.term, flashcard.definition, flashcard.error_count)
+                       for flashcard in Flashcard.flashcards.values()])
+    with open(filename, 'w', buffering=BUFFER_SIZE) as file:
+        file.write(content)
     out(f"{len(Flashcard.flashcards)} cards have been saved.")
 
 
@@ -159,54 +273,54 @@ def ask():
 
     out("How many times to ask?")
     n = int(_input())
-    if n > len(Flashcard.flashcards):
-        # in case n > number of flashcards: n number of cards will be questioned, but duplicates will be allowed
-        flashcards = (list(Flashcard.flashcards.values()) * (n // len(Flashcard.flashcards) + 1))[0:n]
+    values = list(Flashcard.flashcards.values())  # must convert to list for dicts or sets
+    if n > len(values):
+        # in case n > number of flashcards: n number of cards will be questioned, but duplicates will be allowed;
+        # cycling through the deck makes sure every card is asked at least once
+        flashcards = list(islice(cycle(values), n))
     else:
         # random sample with no duplicates
-        flashcards = random.sample(list(Flashcard.flashcards.values()), n)  # must convert to list for dicts or sets
+        flashcards = random.sample(values, n)
 
     for flashcard in flashcards:
         out(f'Print the definition of "{flashcard.term}":')
         guess = _input()
-        if guess.lower() == flashcard.definition.lower():
+        guess_cf = guess.casefold()
+        if guess_cf == flashcard.definition_cf:
             out("Correct!")
         else:
-            if guess in Flashcard.definitions:
+            other_term = Flashcard.term_for_definition(guess_cf)
+            if other_term is not None:
                 out(f'Wrong. The right answer is "{flashcard.definition}", but your definition is correct for '
-                    f'"{Flashcard.definitions[guess]}".')
+                    f'"{other_term}".')
             else:
                 out(f'Wrong. The right answer is "{flashcard.definition}".')
 
             flashcard.error_count += 1
+            Flashcard.track_errors(flashcard)
 
 
 def log():
     """Save all contents of console to specified file.
-    Contents of console are stored in the 'output' variable that is an io.StringIO object."""
+    Contents of console are stored in the 'output_lines' list, one entry per line."""
 
     out("File name:")
     filename = input()
-    content = output.getvalue().split('\n')
-    with open(filename, 'w') as file:
-        for line in content:
-            print(line, file=file)
+    with open(filename, 'w', buffering=BUFFER_SIZE) as file:
+        file.write('\n'.join(output_lines) + '\n')
     out('The log has been saved')
 
 
 def hardest_card():
     """Display the hardest card/cards. Hardest card is one that has the highest error count."""
 
-    errors = [flashcard.error_count for flashcard in Flashcard.flashcards.values()]
-    max_error = max(errors) if errors else 0
+    max_error = Flashcard.max_error
     if max_error == 0:
         out("There are no cards with errors.")
         return
-    hardest_cards = []
 
-    for flashcard in Flashcard.flashcards.values():
-        if flashcard.error_count == max_error:
-            hardest_cards.append(flashcard.term)
+    flashcards = Flashcard.flashcards
+    hardest_cards = sorted(Flashcard.hardest_terms, key=lambda term: flashcards[term].position)  # deck order
 
     if len(hardest_cards) == 1:
         out(f'The hardest card is "{hardest_cards[0]}". You have {max_error} errors answering it.')
@@ -220,28 +334,35 @@ def reset_stats():
 
     for flashcard in Flashcard.flashcards.values():
         flashcard.error_count = 0
+    Flashcard.max_error = 0
+    Flashcard.hardest_terms = set()
     out("Card statistics have been reset.")
 
 
+def quit_program():
+    """Say goodbye to the user. Returns True to signal the main loop to stop."""
+
+    out('Bye bye!')
+    return True
+
+
 def main():
     args = get_args()
     if args.import_from:
         import_file(args.import_from)
 
     actions = {'add': add, 'remove': remove, 'import': import_file, 'export': export, 'ask': ask, 'log': log,
-               'hardest card': hardest_card, 'reset stats': reset_stats}
+               'hardest card': hardest_card, 'reset stats': reset_stats, 'exit': quit_program}
 
     while True:
         out("Input the action (add, remove, import, export, ask, exit, log, hardest card, reset stats):")
         action = _input()
 
-        if action == 'exit':
-            out('Bye bye!')
-            break
-        try:
-            actions[action]()
-        except KeyError:
+        handler = actions.get(action)
+        if handler is None:
             continue
+        if handler():  # only quit_program() returns a truthy value
+            break
         out('')
 
     if args.export_to: